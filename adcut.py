@@ -1,15 +1,23 @@
 #!/usr/bin/python3
 
 import argparse
+import os
+import re
 import subprocess
+from concurrent.futures import ProcessPoolExecutor
 import sublib
 
 
-VERSION = '0.0.1'
+VERSION = '0.1.0'
 
 TRIM = "[0:v]trim=start={start}:end={end},setpts=PTS-STARTPTS[v{name}];" \
        "[0:a]atrim=start={start}:end={end},asetpts=PTS-STARTPTS[a{name}];"
 CONCAT = "[v{prev}][v{name}]concat[vc{name}];[a{prev}][a{name}]concat=v=0:a=1[ac{name}];"
+DETECT = "scale=-2:{height},blackdetect=d={duration}:pix_th={threshold}"
+DURATION_RE = re.compile(r'Duration: (\d+:\d+:\d+\.\d+)')
+BLACK_RE = re.compile(r'black_start: *([-\d.e]+) +black_end: *([-\d.e]+)')
+SILENCE_START_RE = re.compile(r'silence_start: *([-\d.e]+)')
+SILENCE_END_RE = re.compile(r'silence_end: *([-\d.e]+)')
 
 
 def process_video(ffmpeg_path: str, input_path: str, parts_to_save: sublib.Subs, output_path: str, *ffmpeg_args):
@@ -24,17 +32,113 @@ def process_video(ffmpeg_path: str, input_path: str, parts_to_save: sublib.Subs,
                      '-map', '[v%s]' % out_name, '-map', '[a%s]' % out_name, *ffmpeg_args, output_path])
 
 
+def media_duration(ffmpeg_path: str, input_path: str) -> float:
+    result = subprocess.run([ffmpeg_path, '-i', input_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    match = DURATION_RE.search(result.stderr.decode(errors='replace'))
+    if match is None:
+        raise RuntimeError("Error: cannot get the duration of %s" % repr(input_path))
+    return float(sublib.Timestamp(match.group(1), 'ass').sec)
+
+
+def detect_chunk(ffmpeg_path: str, input_path: str, start: float, length: float,
+                 height: int, black_duration: float, black_threshold: float, noise: str) -> tuple:
+    """Runs blackdetect and silencedetect over a part of the video.
+    Returns lists of black and silent intervals in seconds from the beginning of the video"""
+    result = subprocess.run([ffmpeg_path, '-ss', str(start), '-t', str(length), '-i', input_path,
+                             '-vf', DETECT.format(height=height, duration=black_duration, threshold=black_threshold),
+                             '-af', 'silencedetect=n={}:d={}'.format(noise, black_duration),
+                             '-f', 'null', '-'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    log = result.stderr.decode(errors='replace')
+    if result.returncode != 0:
+        raise RuntimeError("Error: ffmpeg failed on the chunk of %s starting at %s:\n%s"
+                           % (repr(input_path), start, '\n'.join(log.strip().split('\n')[-10:])))
+    blacks = [(start + max(0.0, float(b)), start + float(e)) for b, e in BLACK_RE.findall(log)]
+    silences = []
+    silence_start = None
+    for line in log.split('\n'):
+        match = SILENCE_START_RE.search(line)
+        if match:
+            silence_start = start + max(0.0, float(match.group(1)))
+        match = SILENCE_END_RE.search(line)
+        if match and silence_start is not None:
+            silences.append((silence_start, start + float(match.group(1))))
+            silence_start = None
+    if silence_start is not None:
+        silences.append((silence_start, start + length))
+    return blacks, silences
+
+
+def merge_intervals(intervals, tolerance: float) -> list:
+    """Joins overlapping intervals and the ones closer than tolerance, e.g. parts of one interval split by chunks"""
+    ans = []
+    for begin, end in sorted(intervals):
+        if ans and begin <= ans[-1][1] + tolerance:
+            ans[-1] = (ans[-1][0], max(ans[-1][1], end))
+        else:
+            ans.append((begin, end))
+    return ans
+
+
+def intersect_intervals(first: list, second: list) -> list:
+    """Intersection of two sorted lists of disjoint intervals"""
+    ans = []
+    i = j = 0
+    while i < len(first) and j < len(second):
+        begin, end = max(first[i][0], second[j][0]), min(first[i][1], second[j][1])
+        if begin < end:
+            ans.append((begin, end))
+        if first[i][1] < second[j][1]:
+            i += 1
+        else:
+            j += 1
+    return ans
+
+
+def detect_pieces(ffmpeg_path: str, input_path: str, jobs: int = None, chunk: float = 300, overlap: float = 5,
+                  min_piece: float = 60, height: int = 120, black_duration: float = 0.1,
+                  black_threshold: float = 0.1, noise: str = '-50dB') -> sublib.Subs:
+    """Finds the breaks (black and silent at once) and returns the pieces between them longer than min_piece.
+    The video is analysed in chunks of the given length in parallel processes"""
+    duration = media_duration(ffmpeg_path, input_path)
+    starts = [index * chunk for index in range(int(duration // chunk) + 1) if index * chunk < duration]
+    with ProcessPoolExecutor(jobs) as executor:
+        futures = [executor.submit(detect_chunk, ffmpeg_path, input_path, start, chunk + overlap,
+                                   height, black_duration, black_threshold, noise) for start in starts]
+        results = [future.result() for future in futures]
+    blacks = merge_intervals((interval for chunk_blacks, _ in results for interval in chunk_blacks), black_duration)
+    silences = merge_intervals((interval for _, chunk_silences in results for interval in chunk_silences),
+                               black_duration)
+    breaks = intersect_intervals(blacks, silences)
+    pieces = sublib.Subs()
+    bounds = [0.0] + [point for interval in breaks for point in interval] + [duration]
+    for begin, end in zip(bounds[::2], bounds[1::2]):
+        if end - begin >= min_piece:
+            timing = sublib.Timing(begin, end, 'sec')
+            pieces.append(sublib.Event(timing=timing, text='Part {}'.format(len(pieces) + 1)))
+    pieces.set_default_resolution()
+    return pieces
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Remove several parts of the video using a subtitles file. '
                                                  "By default, it saves the parts covered by subtitles' timing. "
                                                  'Use --reverse flag to change this behaviour. '
                                                  'Note that the output file will be rewritten anyway.')
     parser.add_argument('video', help='input video path')
-    parser.add_argument('subs', type=sublib.Subs.parse, help='input subtitles path')
+    parser.add_argument('subs', help='input subtitles path, or output path for the detected pieces with --detect')
     parser.add_argument('-o', '--output', default='out.mp4', metavar='OUT',
                         help="output video path, defaults to 'out.mp4'")
     # parser.add_argument('-r', '--reverse', action='store_true',
     #                     help="if set, the script will REMOVE the parts covered by subtitles' timing")
+    parser.add_argument('-d', '--detect', action='store_true',
+                        help='detect the breaks (black and silent frames) and write the pieces between them '
+                             'into the subtitles file instead of cutting the video')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='number of parallel ffmpeg processes for --detect, defaults to the number of CPUs')
+    parser.add_argument('-c', '--chunk', type=float, default=300, metavar='SEC',
+                        help='length of the video chunk analysed by one process, defaults to 300 seconds')
+    parser.add_argument('-m', '--min-piece', type=float, default=60, metavar='SEC',
+                        help='shorter pieces are considered ads and dropped, defaults to 60 seconds')
     parser.add_argument('-fp', '--ffmpeg-path', default='ffmpeg', metavar='PATH',
                         help='set the directory with ffmpeg binary, required unless ffmpeg is in OS PATH')
     # parser.add_argument('-fd', '--ffmpeg-default', action='store_true',
@@ -46,4 +150,10 @@ if __name__ == '__main__':
                                 'anon2anon, https://www.sunnysubs.com'.format(VERSION))
 
     args = parser.parse_args()
-    process_video(args.ffmpeg_path, args.video, args.subs, args.output, *args.ffmpeg_args)
+    if args.detect:
+        detect_pieces(args.ffmpeg_path, args.video, args.jobs, args.chunk,
+                      min_piece=args.min_piece).output_ass(args.subs)
+    else:
+        subs = sublib.Subs.parse(args.subs)
+        if subs is not None:
+            process_video(args.ffmpeg_path, args.video, subs, args.output, *args.ffmpeg_args)
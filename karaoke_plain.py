@@ -1,20 +1,30 @@
 from copy import deepcopy
-from sublib import Subs, Timing
-import re
+from sublib import Subs, Timing, join_tags
 
-KARAOKE_REGEX = re.compile(r'{\\k(\d+)}')
+KARAOKE_TAGS = frozenset(('k', 'K', 'kf', 'ko'))
 
 if __name__ == '__main__':
     subs = Subs.parse('haiku.ass')
     new_subs = deepcopy(subs)
     new_subs.data.clear()
     for event in subs:
+        syllables = []  # [duration, text until the next karaoke tag]
+        for token in event.tokens:
+            durations = [int(argument) if argument.isdigit() else 0
+                         for name, argument in token.tags if name in KARAOKE_TAGS]
+            if durations:
+                other_tags = [tag for tag in token.tags if tag[0] not in KARAOKE_TAGS]
+                syllables.append([durations[-1], join_tags(other_tags) if other_tags else ''])
+            elif syllables:
+                syllables[-1][1] += token.text
+        pieces = [text for _, text in syllables]
         current_sum = event['timing'].begin.ss
-        for index, clause in enumerate(KARAOKE_REGEX.finditer(event['text'])):
-            new_sum = current_sum + int(clause.group(1))
+        for index, (duration, _) in enumerate(syllables):
+            new_sum = current_sum + duration
+            if duration == 0:
+                continue
             new_event = deepcopy(event)
             new_event['timing'] = Timing(current_sum, new_sum, 'ss')
-            pieces = KARAOKE_REGEX.split(event['text'])[2::2]
             new_event['text'] = ''.join(pieces[:index+1]) + '{\\alpha&HFF&}' + ''.join(pieces[index+1:])
             new_subs.append(new_event)
             current_sum = new_sum
@@ -19,7 +19,6 @@ good_symbols = frozenset(list(chr(i) for i in range(ord('a'), ord('z') + 1)) +
                          list(chr(i) for i in range(ord('A'), ord('Z') + 1)) +
                          list(chr(i) for i in range(ord('0'), ord('9') + 1)) +
                          list('()!.,?;:\'♪" \n-'))
-effects = re.compile(r'<.*?>', re.DOTALL)
 brackets = re.compile(r'\[.*?\]', re.DOTALL)
 sentence_border = re.compile(r'([?!.♪]|…$)')
 word_regex = re.compile(r'(\w+)')
@@ -52,7 +51,6 @@ def capitalize(word):
 
 def process_plain_text(text: str):
     global start_of_sentence
-    text = effects.sub('', text)
     text = brackets.sub('', text)
     text = ''.join(letter for letter in text if letter in good_symbols)
     text = text.replace('...', '…').replace('\n', ' ').replace('--', ' — ')
@@ -105,7 +103,7 @@ if __name__ == '__main__':
     args = parser.parse_args()
     processed_subs = sublib.Subs()
     for event in args.subs:
-        processed_text = process_plain_text(event['text'])
+        processed_text = process_plain_text(event.plain)
         if any(s.isalnum() for s in processed_text):
             processed_subs.append(sublib.Event(text=processed_text, timing=event['timing']))
     output_subs = sublib.Subs()
@@ -1,11 +1,18 @@
 """My subtitles library: at the moment supports .srt and .ass"""
 from __future__ import division, unicode_literals
-from collections import UserDict, UserList
+from array import array
+from bisect import bisect_left
+from collections import UserDict, UserList, namedtuple
 from copy import deepcopy
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from itertools import tee
+import argparse
+import hashlib
 import os
+import pickle
 import re
+import sys
+import time
 
 
 INVISIBLE_CHARS = re.compile(r"[\u115f\u1160\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a\u200b"
@@ -14,6 +21,16 @@ STYLE_FORMAT = "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour
                "Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow," \
                " Alignment, MarginL, MarginR, MarginV, Encoding"
 EVENT_FORMAT = "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text"
+XVID_FRAME_TYPES = frozenset('ipbs')
+TAG_NAMES = sorted('alpha 1a 2a 3a 4a 1c 2c 3c 4c c an a blur bord xbord ybord be b iclip clip fade fad fax fay fe fn '
+                   'frx fry frz fr fscx fscy fsp fs i kf ko k K move org pbo p pos q r shad xshad yshad s t u'.split(),
+                   key=len, reverse=True)
+TOKEN_RE = re.compile(r'({[^}]*})|(\\N|\\n|\n)|(</?[a-zA-Z0-9][^<>]*>)')
+PAREN_TAGS = frozenset('clip iclip fad fade move org pos t'.split())
+TAG_RE = re.compile(r'\\(' + '|'.join(TAG_NAMES) + r'|[^\\(]*)(\((?:[^()]|\([^()]*\))*\)|[^\\]*)')
+WORD_RE = re.compile(r'\w+')
+TEXT, TAGS, BREAK, MARKUP = 'text', 'tags', 'break', 'markup'  # markup: srt/vtt <i>, <font ...>, <00:01.000>
+Token = namedtuple('Token', 'kind text tags')  # tags: tuple of (name, argument) for override blocks
 
 
 def pairwise(iterable):
@@ -29,6 +46,126 @@ def preprocess(text: str) -> str:
     return INVISIBLE_CHARS.sub(' ', text).strip()
 
 
+def parse_tags(block: str) -> tuple:
+    """{\\pos(1,2)\\b1} -> (('pos', '1,2'), ('b', '1'))"""
+    tags = []
+    for match in TAG_RE.finditer(block[1:-1]):
+        name, argument = match.group(1), match.group(2).strip()
+        if argument[:1] == '(' and argument[-1:] == ')':
+            argument = argument[1:-1]
+        tags.append((name, argument))
+    return tuple(tags)
+
+
+def join_tags(tags) -> str:
+    """Inverse of parse_tags: (('pos', '1,2'), ('b', '1')) -> {\\pos(1,2)\\b1}"""
+    return '{' + ''.join('\\{}({})'.format(name, argument) if name in PAREN_TAGS else '\\' + name + argument
+                         for name, argument in tags) + '}'
+
+
+def tokenize(text: str) -> tuple:
+    """Splits event text into text runs, override blocks, srt/vtt markup and line breaks in one pass"""
+    tokens = []
+    position = 0
+    for match in TOKEN_RE.finditer(text):
+        if match.start() > position:
+            tokens.append(Token(TEXT, text[position:match.start()], ()))
+        if match.group(1) is not None:
+            tokens.append(Token(TAGS, match.group(1), parse_tags(match.group(1))))
+        elif match.group(2) is not None:
+            tokens.append(Token(BREAK, match.group(2), ()))
+        else:
+            tokens.append(Token(MARKUP, match.group(3), ()))
+        position = match.end()
+    if position < len(text):
+        tokens.append(Token(TEXT, text[position:], ()))
+    return tuple(tokens)
+
+
+def plain_text(text: str) -> str:
+    """Event text without override tags and line breaks"""
+    return join_plain(tokenize(text))
+
+
+def join_plain(tokens) -> str:
+    runs = (token.text if token.kind == TEXT else ' ' for token in tokens if token.kind not in (TAGS, MARKUP))
+    return re.sub(r'\s+', ' ', ''.join(runs).replace('\\h', ' ')).strip()
+
+
+def words(text: str) -> list:
+    """Lowercase words of a plain text"""
+    return WORD_RE.findall(text.lower())
+
+
+def digest(data: bytes) -> bytes:
+    return hashlib.sha1(data).digest()
+
+
+def frame_to_ss(frame: int, fps: Decimal) -> int:
+    """Start time of the given frame in santiseconds"""
+    return int(round(Decimal(frame) * 100 / fps))
+
+
+def parse_keyframes(file_path: str, fps=None) -> array:  # fps: str || int || float || Decimal
+    """Reads keyframes into a sorted array of santiseconds.
+    Supports Aegisub keyframes v1, XviD 2pass stats and ffprobe csv (key_frame,pts_time per frame).
+    Frame-based formats need fps, Aegisub files may carry it in the header."""
+    with open(file_path, 'rb') as keyframes_file:
+        lines = [preprocess(line) for line in keyframes_file.read().decode().split('\n')]
+    lines = [line for line in lines if line != '']
+    if not lines:
+        return array('l')
+    header = lines[0].lower()
+    stamps = []
+    if header.startswith('# keyframe format'):
+        frames = []
+        for line in lines[1:]:
+            if line.startswith('fps'):
+                if Decimal(line.split()[1]) != 0:
+                    fps = line.split()[1]
+            elif not line.startswith('#'):
+                frames.append(int(line))
+    elif header.startswith('# xvid'):
+        frames, frame = [], 0
+        for line in lines[1:]:
+            if line[0] in XVID_FRAME_TYPES:
+                if line[0] == 'i':
+                    frames.append(frame)
+                frame += 1
+    else:
+        frames = None
+        for line in lines:
+            fields = line.split(',')
+            if fields[0] == 'frame':
+                fields = fields[1:]
+            try:
+                if int(fields[0]) == 1:
+                    stamps.append(Timestamp(fields[1], 'sec').ss)
+            except (ValueError, IndexError, InvalidOperation):  # e.g. N/A pts_time
+                continue
+    if frames is not None:
+        if fps is None:
+            raise RuntimeError("Error: fps is required for keyframes file %s" % repr(file_path))
+        fps = Decimal(str(fps))
+        stamps = [frame_to_ss(frame, fps) for frame in frames]
+    return array('l', sorted(set(stamps)))
+
+
+def nearest_keyframe(keyframes: array, ss: int, threshold: int):  # -> int || None
+    """Binary search for the keyframe closest to ss, if it is not further than threshold"""
+    index = bisect_left(keyframes, ss)
+    candidates = keyframes[max(0, index - 1):index + 1]
+    if not candidates:
+        return None
+    best = min(candidates, key=lambda kf: abs(kf - ss))
+    return best if abs(best - ss) <= threshold else None
+
+
+def contains(sorted_array, value) -> bool:
+    index = bisect_left(sorted_array, value)
+    return index < len(sorted_array) and sorted_array[index] == value
+
+
 class Timestamp:
     """Left or right end of an event. Supports 4 formats: ass, srt, ss (santiseconds) and sec (seconds)"""
     def __init__(self, stamp, stamp_type: str):  # stamp: str || int || float || Decimal
@@ -216,8 +353,10 @@ class Event(UserDict):
                ('effect', ''),
                ('text', '')]
     DEF_DICT = dict(DEFAULT)
-    REGEX = re.compile(r'Dialogue:(?: *)(\d+),([0-9:.]+),([0-9:.]+),(.*?),(.*?),(\d+),(\d+),(\d+),(.*?),(.*)')
+    REGEX = re.compile(r'Dialogue:(?: *)(\d+),([0-9:.]+),([0-9:.]+),(.*?),(.*?),(\d+),(\d+),(\d+),(.*?),(.*)',
+                       re.DOTALL)
     TEMPLATE = "Dialogue: " + ",".join("{d[%s]}" % key for key, _ in DEFAULT)
+    INTERNED = ('layer', 'style', 'actor', 'margin_l', 'margin_r', 'margin_v', 'effect')
 
     def __init__(self, **kwargs):
         UserDict.__init__(self, kwargs)
@@ -250,6 +389,42 @@ class Event(UserDict):
     def __str__(self):
         return self.TEMPLATE.format(d=self).replace('\n', '\\N')
 
+    @property
+    def tokens(self) -> tuple:
+        """Tokenized text, cached until the text changes"""
+        text = self['text']
+        cached = getattr(self, '_tokens', None)
+        if cached is None or cached[0] != text:
+            cached = self._tokens = (text, tokenize(text))
+        return cached[1]
+
+    @property
+    def plain(self) -> str:
+        return join_plain(self.tokens)
+
+    def map_text(self, function) -> None:
+        """Applies function to the text runs, leaving override blocks and line breaks untouched"""
+        pieces, run = [], ''
+        for token in self.tokens:
+            if token.kind != TEXT:
+                pieces += [function(run), token.text]
+                run = ''
+            else:
+                run += token.text
+        pieces.append(function(run))
+        self['text'] = ''.join(pieces)
+
+    @property
+    def key(self) -> tuple:
+        """Hashable identity of the event: events with the same key are duplicates"""
+        return self['timing'], self['style'], self['text']
+
+    def intern_fields(self) -> None:
+        """Makes equal short string fields share memory"""
+        for key in self.INTERNED:
+            if key in self.data:
+                self.data[key] = sys.intern(self.data[key])
+
     @classmethod
     def from_ass(cls, dialogue_line: str) -> 'Event':
         match = cls.REGEX.match(dialogue_line)
@@ -348,12 +523,52 @@ class Subs(UserList):
     def add_event(self, dialogue_line: str) -> None:
         self.append(Event.from_ass(dialogue_line))
 
+    def deduplicate(self) -> int:
+        """Removes repeated events (same timing, style and text), keeping the first ones.
+        Returns the number of removed events"""
+        seen = set()
+        unique = []
+        for event in self:
+            key = event.key
+            if key not in seen:
+                seen.add(key)
+                event.intern_fields()
+                unique.append(event)
+        removed = len(self.data) - len(unique)
+        self.data = unique
+        return removed
+
     def check_events_collisions(self) -> None:
         self.sort()
         for event1, event2 in pairwise(self):
             if event1['timing'].collides(event2['timing']):
                 print("Warning: timing collision:\n{}\n{}".format(event1, event2))
 
+    def snap_to_keyframes(self, keyframes: array, threshold: int = 20, link: int = 0) -> list:
+        """Moves events' ends to the nearest keyframes within threshold santiseconds.
+        Gaps of at most link santiseconds between consecutive events of the same style are closed
+        by extending the earlier event, so signs and other tracks are not stretched to dialogue lines.
+        Returns the list of (old timing, new timing) pairs for all changed events."""
+        self.sort()
+        old_timings = []
+        last_by_style = {}  # style: event of this style ending last so far
+        for event in self:
+            old = event['timing']
+            old_timings.append(old)
+            begin, end = (nearest_keyframe(keyframes, stamp.ss, threshold) for stamp in (old.begin, old.end))
+            timing = Timing(old.begin.ss if begin is None else begin, old.end.ss if end is None else end, 'ss')
+            event['timing'] = timing if len(timing) > 0 else deepcopy(old)
+            previous = last_by_style.get(event['style'])
+            if previous is not None and 0 < event['timing'].begin - previous['timing'].end <= link:
+                previous['timing'].end = deepcopy(event['timing'].begin)
+            if previous is None or previous['timing'].end <= event['timing'].end:
+                last_by_style[event['style']] = event
+        report = [(old, event['timing']) for old, event in zip(old_timings, self) if event['timing'] != old]
+        if self.VERBOSE:
+            for old, new in report:
+                print("Snapped {} -> {}".format(old, new))
+        return report
+
     def ensure_consistent_timing(self) -> None:
         for event in self:
             if not event['timing'].consistent:
@@ -477,16 +692,20 @@ class Subs(UserList):
                 del self.styles[key]
 
     def unify_symbols(self) -> None:
+        def unify(text: str) -> str:
+            text = re.sub(r'\s+', ' ', text.replace('...', '…').replace(' - ', ' — '))
+            return re.sub(r'… ?', '… ', text)
+
         for event in self:
-            event['text'] = re.sub(r'\s+', ' ', event['text'].replace('...', '…').replace(' - ', ' — '))
-            event['text'] = re.sub(r'… ?', '… ', event['text']).strip()
+            event.map_text(unify)
+            event['text'] = event['text'].strip()
 
     def language_processing(self, lang: str) -> None:
         for event in self:
             if lang == 'rus':
-                event['text'] = event['text'].replace('…?', '?..').replace('…!', '!..').replace('c', 'с')
+                event.map_text(lambda text: text.replace('…?', '?..').replace('…!', '!..').replace('c', 'с'))
             elif lang == 'eng':
-                event['text'] = event['text'].replace('?..', '…?').replace('!..', '…!')
+                event.map_text(lambda text: text.replace('?..', '…?').replace('!..', '…!'))
                 event['text'] = re.sub(r' ?— ?$', '…', event['text'])
             else:
                 print("Warning: unsupported language {}, no language processing performed.".format(repr(lang)))
@@ -515,13 +734,15 @@ class Subs(UserList):
         output_events = [str(event) for event in self]
         return '\n'.join(output_events) + '\n'
 
-    def output_ass(self, file_path: str) -> None:
-        text = '\ufeff[Script Info]\n{info}\n[V4+ Styles]\n{style_format}\n'\
+    def join_ass(self) -> str:
+        return '\ufeff[Script Info]\n{info}\n[V4+ Styles]\n{style_format}\n'\
                '{styles}\n[Events]\n{event_format}\n{events}'\
                 .format(info=self.join_info(), styles=self.join_styles(), events=self.join_events(),
                         style_format=STYLE_FORMAT, event_format=EVENT_FORMAT)
+
+    def output_ass(self, file_path: str) -> None:
         with open(file_path, "wb") as f:
-            f.write(text.replace('\n', '\r\n').encode())
+            f.write(self.join_ass().replace('\n', '\r\n').encode())
 
     def output_srt(self, file_path: str) -> None:
         self.sort()
@@ -533,35 +754,298 @@ class Subs(UserList):
         with open(file_path, "wb") as f:
             f.write(text.strip().replace('\n', '\r\n').encode())
 
-    def clean_ass(self, file_path: str, lang: str) -> None:
-        ans = deepcopy(self)
+    def cleaned(self, lang: str, cache: dict = None) -> 'Subs':
+        """Copy of the subs prepared for release. Per-event processing results are stored in cache
+        by the digest of the original event, so the events met before are not processed again.
+        Note that cached events are shared between the results."""
+        if cache is None:
+            cache = {}
+        ans = self.__class__()
+        ans.script_info = deepcopy(self.script_info)
+        ans.styles = deepcopy(self.styles)
+        keys = [digest(str(event).encode()) for event in self]
+        new_events = self.__class__()
+        new_keys = []
+        for key, event in zip(keys, self):
+            if key not in cache:
+                cache[key] = None
+                new_keys.append(key)
+                new_events.append(deepcopy(event))
+        new_events.remove_actors()
+        new_events.unify_symbols()
+        new_events.language_processing(lang)
+        cache.update(zip(new_keys, new_events))
+        ans.data = [cache[key] for key in keys]
         ans.remove_extra_styles()
-        ans.remove_actors()
-        ans.unify_symbols()
-        ans.language_processing(lang)
         ans.set_default_resolution()
         ans.set_default_styles()
         if self.VERBOSE:
             ans.check_events_collisions()
             ans.ensure_consistent_timing()
-        ans.output_ass(file_path)
+        return ans
+
+    def clean_ass(self, file_path: str, lang: str) -> None:
+        self.cleaned(lang).output_ass(file_path)
+
+
+def merge_output_name(filenames) -> str:
+    for filename in filenames:
+        match = re.search(r'[sS](\d{1,2})[eE](\d{1,2})', filename)
+        if match:
+            return 'S{}E{}.ass'.format(*(match.group(i).zfill(2) for i in (1, 2)))
+    return 'SXXEXX.ass'
+
+
+def concatenate(subs_list) -> Subs:
+    """Same as sum(subs_list), but without copying the inputs.
+    Repeated events are removed and identical styles are shared between the inputs"""
+    ans = Subs()
+    styles_pool = {}  # Style line: Style object
+    for subs in subs_list:
+        for name, style in subs.styles.items():
+            subs.styles[name] = styles_pool.setdefault(str(style), style)
+        ans.data += subs.data
+        ans.styles.update(subs.styles)
+        ans.script_info = subs.script_info
+    removed = ans.deduplicate()
+    if removed and Subs.VERBOSE:
+        print("Removed {} duplicate events".format(removed))
+    return ans
 
 
 def merge(dir_name='merge') -> None:
     subs = []
-    s, e = 'XX', 'XX'
     for filename in os.listdir(dir_name):
-        match = re.search(r'[sS](\d{1,2})[eE](\d{1,2})', filename)
-        if match and s == 'XX':
-            s, e = [match.group(i).zfill(2) for i in (2, 4)]
         try:
             sbs = Subs.parse(os.path.join(dir_name, filename))
             if sbs is not None:
                 subs.append(sbs)
         except UnicodeDecodeError:
             pass
-    sum(subs).clean_ass(os.path.join(dir_name, 'S{}E{}.ass'.format(s, e)), 'eng')
+    concatenate(subs).clean_ass(os.path.join(dir_name, merge_output_name(os.listdir(dir_name))), 'eng')
+
+
+class MergeWatcher:
+    """Keeps the result of merge up to date by polling the directory.
+    Only the files with changed size/mtime and content are parsed again,
+    only the events not seen before are cleaned again,
+    and the output is rewritten only if its content differs."""
+    EXTENSIONS = ('.ass', '.srt', '.vtt', '.txt')
+
+    def __init__(self, dir_name: str = 'merge', lang: str = 'eng'):
+        self.dir_name = dir_name
+        self.lang = lang
+        self.files = {}  # filename: (size, mtime, digest, Subs object)
+        self.events_cache = {}  # digest of an original event: cleaned Event object
+        self.failures = {}  # filename: last parsing error
+        self.output_name = None
+
+    def scan(self) -> bool:
+        """Updates the parsed files, returns whether anything has changed"""
+        changed = False
+        all_filenames = os.listdir(self.dir_name)
+        if self.output_name is None:
+            self.output_name = merge_output_name(all_filenames)
+        filenames = sorted(name for name in all_filenames
+                           if name[-4:] in self.EXTENSIONS and name != self.output_name)
+        for name in set(self.files) - set(filenames):
+            del self.files[name]
+            changed = True
+        for name in set(self.failures) - set(filenames):
+            del self.failures[name]
+        for name in filenames:
+            path = os.path.join(self.dir_name, name)
+            try:
+                stat = os.stat(path)
+                if name in self.files and self.files[name][:2] == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                with open(path, 'rb') as f:
+                    file_digest = digest(f.read())
+                if name in self.files and self.files[name][2] == file_digest:
+                    subs = self.files[name][3]
+                else:
+                    subs = Subs.parse(path)
+                    changed = True
+            except (OSError, UnicodeDecodeError, RuntimeError) as error:
+                # Keep the last good parse (e.g. during a half-written save) and retry on the next poll
+                if Subs.VERBOSE and self.failures.get(name) != str(error):
+                    print("Warning: cannot parse {}, keeping its previous version: {}".format(repr(name), error))
+                self.failures[name] = str(error)
+                continue
+            self.failures.pop(name, None)
+            self.files[name] = (stat.st_size, stat.st_mtime_ns, file_digest, subs)
+        return changed
+
+    def merged(self) -> Subs:
+        return concatenate(self.files[name][3] for name in sorted(self.files) if self.files[name][3] is not None)
+
+    def update(self) -> bool:
+        """Rewrites the output if needed, returns whether it was rewritten"""
+        if not self.scan():
+            return False
+        live_keys = set()
+        result = self.merged()
+        for event in result:
+            live_keys.add(digest(str(event).encode()))
+        for key in set(self.events_cache) - live_keys:
+            del self.events_cache[key]
+        text = result.cleaned(self.lang, self.events_cache).join_ass().replace('\n', '\r\n').encode()
+        output_path = os.path.join(self.dir_name, self.output_name)
+        if os.path.isfile(output_path):
+            with open(output_path, 'rb') as f:
+                if f.read() == text:
+                    return False
+        with open(output_path, 'wb') as f:
+            f.write(text)
+        return True
+
+    def run(self, interval: float = 1.0) -> None:
+        while True:
+            if self.update() and Subs.VERBOSE:
+                print("Updated {}".format(os.path.join(self.dir_name, self.output_name)))
+            time.sleep(interval)
+
+
+def watch(dir_name='merge', interval: float = 1.0, lang: str = 'eng') -> None:
+    MergeWatcher(dir_name, lang).run(interval)
+
+
+class SubsIndex:
+    """Inverted index over a subtitles archive: word -> events containing it.
+    Postings of a word are stored in a sorted array of (file id << EVENT_BITS | event index)."""
+    EXTENSIONS = ('.ass', '.srt', '.vtt')
+    EVENT_BITS = 20
+    FORMAT = 2  # indexes of other formats are rebuilt from scratch
+
+    def __init__(self):
+        self.paths = []  # file id: path or None
+        self.files = {}  # path: (file id, size, mtime, begins, ends, texts, words)
+        self.postings = {}  # word: array of postings
+
+    @classmethod
+    def load(cls, index_path: str) -> 'SubsIndex':
+        if not os.path.isfile(index_path):
+            return cls()
+        with open(index_path, 'rb') as f:
+            data = pickle.load(f)
+        ans = cls()
+        if len(data) == 4 and data[0] == cls.FORMAT:
+            _, ans.paths, ans.files, ans.postings = data
+        return ans
+
+    def save(self, index_path: str) -> None:
+        with open(index_path + '.tmp', 'wb') as f:
+            pickle.dump((self.FORMAT, self.paths, self.files, self.postings), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(index_path + '.tmp', index_path)
+
+    def file_range(self, file_id: int) -> tuple:
+        return file_id << self.EVENT_BITS, (file_id + 1) << self.EVENT_BITS
+
+    def remove_file(self, path: str) -> None:
+        file_id, *_, file_words = self.files.pop(path)
+        low, high = self.file_range(file_id)
+        for word in file_words:
+            postings = self.postings[word]
+            del postings[bisect_left(postings, low):bisect_left(postings, high)]
+            if not postings:
+                del self.postings[word]
+        self.paths[file_id] = None
+
+    def add_file(self, path: str, stat: os.stat_result, subs: Subs) -> None:
+        if path in self.files:
+            self.remove_file(path)
+        file_id = len(self.paths)
+        self.paths.append(path)
+        begins, ends, texts = array('l'), array('l'), []
+        file_postings = {}  # word: event indices
+        subs.sort()
+        for index, event in enumerate(subs.data[:1 << self.EVENT_BITS]):
+            text = event.plain
+            begins.append(event['timing'].begin.ss)
+            ends.append(event['timing'].end.ss)
+            texts.append(text)
+            for word in set(words(text)):
+                file_postings.setdefault(word, array('Q')).append(file_id << self.EVENT_BITS | index)
+        low, _ = self.file_range(file_id)
+        for word, postings in file_postings.items():
+            self.postings.setdefault(word, array('Q'))
+            position = bisect_left(self.postings[word], low)
+            self.postings[word][position:position] = postings
+        self.files[path] = (file_id, stat.st_size, stat.st_mtime_ns, begins, ends, texts, sorted(file_postings))
+
+    def update(self, root: str) -> tuple:
+        """Indexes new and changed files under root, forgets the deleted ones.
+        Returns the numbers of (re)indexed and removed files"""
+        root = os.path.abspath(root)
+        found = set()
+        indexed = 0
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename[-4:] not in self.EXTENSIONS:
+                    continue
+                path = os.path.join(directory, filename)
+                found.add(path)
+                try:
+                    stat = os.stat(path)
+                    if path in self.files and self.files[path][1:3] == (stat.st_size, stat.st_mtime_ns):
+                        continue
+                    subs = Subs.parse(path)
+                except (OSError, UnicodeDecodeError, RuntimeError) as error:
+                    print("Warning: skipping {}: {}".format(repr(path), error))
+                    continue
+                if subs is not None:
+                    self.add_file(path, stat, subs)
+                    indexed += 1
+        removed = [path for path in self.files if path.startswith(root + os.sep) and path not in found]
+        for path in removed:
+            self.remove_file(path)
+        if len(self.files) < len(self.paths) // 2:
+            self.compact()
+        return indexed, len(removed)
+
+    def compact(self) -> None:
+        """Renumbers the files, dropping the ids of removed files"""
+        files = self.files
+        self.paths, self.files, self.postings = [], {}, {}
+        for path, (_, size, mtime, begins, ends, texts, file_words) in sorted(files.items()):
+            file_id = len(self.paths)
+            self.paths.append(path)
+            self.files[path] = (file_id, size, mtime, begins, ends, texts, file_words)
+            for index, text in enumerate(texts):
+                for word in sorted(set(words(text))):
+                    self.postings.setdefault(word, array('Q')).append(file_id << self.EVENT_BITS | index)
+
+    def search(self, query: str) -> list:
+        """Events containing the query as a sequence of words.
+        Returns a list of (path, begin in ms, end in ms, plain text)"""
+        query_words = words(plain_text(query))
+        if not query_words or any(word not in self.postings for word in query_words):
+            return []
+        rarest = min(set(query_words), key=lambda word: len(self.postings[word]))
+        candidates = set(self.postings[rarest])
+        for word in set(query_words) - {rarest}:
+            postings = self.postings[word]
+            candidates = set(posting for posting in candidates if contains(postings, posting))
+        phrase = ' ' + ' '.join(query_words) + ' '
+        ans = []
+        for posting in sorted(candidates):
+            file_id, index = divmod(posting, 1 << self.EVENT_BITS)
+            path = self.paths[file_id]
+            _, _, _, begins, ends, texts, _ = self.files[path]
+            if phrase in ' ' + ' '.join(words(texts[index])) + ' ':
+                ans.append((path, begins[index] * 10, ends[index] * 10, texts[index]))
+        return ans
 
 
 if __name__ == '__main__':
-    merge('.')
+    parser = argparse.ArgumentParser(description='Merge all the subtitles in the directory into one cleaned .ass file.')
+    parser.add_argument('dir', nargs='?', default='.', help="directory to merge, defaults to '.'")
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='keep running and update the output whenever the input files change')
+    parser.add_argument('-i', '--interval', type=float, default=1.0, metavar='SEC',
+                        help='polling interval for --watch, defaults to 1 second')
+    args = parser.parse_args()
+    if args.watch:
+        watch(args.dir, args.interval)
+    else:
+        merge(args.dir)
@@ -0,0 +1,32 @@
+#!/usr/bin/python3
+
+import argparse
+import sublib
+
+
+VERSION = '0.0.1'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Search for a phrase in the subtitles archive. '
+                                                 'The index is updated incrementally: only new and changed '
+                                                 'files are parsed again.')
+    parser.add_argument('query', nargs='?', help='phrase to search, only updates the index if omitted')
+    parser.add_argument('-a', '--archive', action='append', default=[], metavar='DIR',
+                        help='update the index with the subtitles in DIR before searching, can be repeated')
+    parser.add_argument('-i', '--index', default='subs.index', metavar='PATH',
+                        help="index file path, defaults to 'subs.index'")
+    parser.add_argument('-v', '--version', action='version',
+                        version='Subsearch, version {}, created by Wolfram, '
+                                'anon2anon, https://www.sunnysubs.com'.format(VERSION))
+
+    args = parser.parse_args()
+    index = sublib.SubsIndex.load(args.index)
+    if args.archive:
+        for archive in args.archive:
+            indexed, removed = index.update(archive)
+            print("{}: {} files indexed, {} removed".format(archive, indexed, removed))
+        index.save(args.index)
+    if args.query is not None:
+        for path, begin, end, text in index.search(args.query):
+            print("{}\t{}\t{}\t{}".format(path, begin, end, text))